@@ -4,12 +4,22 @@ Maven Bookshelf Challenge 2025
 A custom book recommendation engine built with Goodreads data
 """
 
+import numpy as np
 import pandas as pd
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.dataset as ds
 import streamlit as st
 import re
+import base64
+import html
+import io
+from collections import OrderedDict
+from functools import partial
 import os
-import urllib.request
-import sys
+import string
+import time
+import ahocorasick_rs
 
 # ===============================================================================
 # CONFIGURATION
@@ -21,57 +31,204 @@ st.set_page_config(
     layout="wide"
 )
 
+# Cover shown for books without an image, inlined as an SVG data URI so it
+# needs no request to an external placeholder service
+NO_COVER_IMAGE = "data:image/svg+xml;base64," + base64.b64encode(
+    b'<svg xmlns="http://www.w3.org/2000/svg" width="120" height="180" viewBox="0 0 120 180">'
+    b'<rect width="120" height="180" fill="#d3d3d3"/>'
+    b'<text x="60" y="95" font-family="sans-serif" font-size="14" fill="#555" text-anchor="middle">No Cover</text>'
+    b'</svg>'
+).decode('ascii')
+
 # ===============================================================================
 # DATA LOADING
 # ===============================================================================
 
-@st.cache_data(ttl=3600)
+# Only the columns the app uses, with the narrowest dtype that fits each
+WORKS_DTYPES = {
+    'work_id': 'int32',
+    'original_title': 'string',
+    'author': 'category',
+    'original_publication_year': 'Int16',  # nullable: a few books have no year or page count
+    'num_pages': 'Int16',  # the longest book has a few thousand pages
+    'description': 'string',
+    'genres': 'category',
+    'image_url': 'string',
+    'text_reviews_count': 'int32',
+    'ratings_count': 'int32',
+    'avg_rating': 'float32',
+    'similar_books': 'string',
+}
+
+REVIEWS_DTYPES = {
+    'work_id': 'int32',
+    'rating': 'float32',  # a few reviews have no rating, so this can't be an integer
+    'review_text': 'string',
+    'n_votes': 'int32',
+}
+
+
+# Small row groups let per-book scans of the sorted full reviews skip most of the file
+PARQUET_ROW_GROUP_SIZE = 64_000
+
+
+def parquet_path_for(csv_path):
+    """Return the Parquet cache path that sits next to a CSV file."""
+    return os.path.splitext(csv_path)[0] + '.parquet'
+
+
+def has_current_parquet(csv_path):
+    """Check that a CSV's Parquet cache exists and is not older than the CSV itself."""
+    parquet_path = parquet_path_for(csv_path)
+    if not os.path.exists(parquet_path):
+        return False
+    # A CSV replaced after the cache was written (e.g. a new reviews sample) wins
+    return not os.path.exists(csv_path) or os.path.getmtime(csv_path) <= os.path.getmtime(parquet_path)
+
+
+def convert_to_parquet(csv_path, dtype, usecols=None, sort_by=None, required=False):
+    """Parse a CSV once with explicit dtypes and cache it as Parquet for later runs.
+
+    A failed write is ignored unless ``required`` is set, for callers that
+    can only read the data back from the Parquet file.
+    """
+    # pandas' engine='pyarrow' can't handle the multi-line descriptions and
+    # reviews, so call Arrow's multi-threaded CSV reader directly
+    table = pa_csv.read_csv(
+        csv_path,
+        parse_options=pa_csv.ParseOptions(newlines_in_values=True),
+        convert_options=pa_csv.ConvertOptions(include_columns=usecols or [], strings_can_be_null=True),
+    )
+    df = table.to_pandas().astype(dtype)
+    if sort_by:
+        df = df.sort_values(sort_by, kind='stable', ignore_index=True)
+    parquet_path = parquet_path_for(csv_path)
+    # Write next to the target and move it into place, so a conversion killed
+    # halfway never leaves a truncated file that later loads would trust
+    tmp_path = parquet_path + '.tmp'
+    try:
+        df.to_parquet(
+            tmp_path, engine='pyarrow', compression='snappy',
+            index=False, row_group_size=PARQUET_ROW_GROUP_SIZE
+        )
+        os.replace(tmp_path, parquet_path)
+    except OSError:
+        # Read-only deployments just fall back to parsing the CSV on each cold start
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        if required:
+            raise
+    return df
+
+
+def read_data_file(csv_path, dtype, columns=None):
+    """Read a dataset from its Parquet cache, (re)converting the CSV when the cache is missing or stale."""
+    if has_current_parquet(csv_path):
+        df = pd.read_parquet(parquet_path_for(csv_path), columns=columns, engine='pyarrow')
+        # Parquet written by an older version may hold wider dtypes; this is a no-op otherwise
+        return df.astype({col: dt for col, dt in dtype.items() if col in df.columns})
+    return convert_to_parquet(csv_path, dtype, usecols=columns)
+
+
+# cache_resource hands back the same DataFrame on every rerun instead of
+# unpickling a fresh copy, so callers must treat these frames as read-only
+@st.cache_resource(ttl=3600)
 def load_works_data():
-    """Load only the works dataset for faster startup."""
+    """Load only the works dataset for faster startup, along with a token identifying this load.
+
+    Helpers cached on the frame take the token as a hashed argument, so a
+    reloaded works table never meets arrays or row positions built from
+    the previous one.
+    """
     try:
-        works = pd.read_csv('Data/goodreads_works.csv', low_memory=False)
-        return works
+        works = read_data_file('Data/goodreads_works.csv', WORKS_DTYPES, columns=list(WORKS_DTYPES))
+        # Lower-cased title, and title + description, so each text filter is a single literal scan
+        works['_title_search'] = works['original_title'].fillna('').str.lower()
+        works['_search_text'] = works['_title_search'] + ' ' + works['description'].fillna('').str.lower()
+        return works, time.time_ns()
     except Exception as e:
         st.error(f"❌ Error loading works data: {e}")
         st.stop()
 
-@st.cache_data(ttl=3600)
-def load_reviews_data(use_full=False):
-    """Load a sample or the full reviews dataset."""
-    if use_full:
-        FULL_PATH = "Data/goodreads_reviews.csv"
-        if not os.path.exists(FULL_PATH):
-            st.error("❌ Full reviews file not found. Please upload 'goodreads_reviews.csv' to the Data folder.")
-            return None
-        st.warning("⚠️ Loading the full reviews dataset may crash your browser or app if you do not have enough memory (1.3GB+ file). Proceed with caution!")
-        path = FULL_PATH
-    else:
-        SAMPLE_PATH = "Data/goodreads_reviews_sample.csv"
-        if not os.path.exists(SAMPLE_PATH):
-            st.error("❌ Sample reviews file not found. Please upload 'goodreads_reviews_sample.csv' to the Data folder.")
-            return None
-        path = SAMPLE_PATH
+@st.cache_resource(ttl=3600)
+def load_reviews_data():
+    """Load the reviews sample into memory, along with a token identifying this load.
+
+    Helpers cached on the frame take the token as a hashed argument, so a
+    sample reloaded after it was replaced never meets an index built from
+    the previous one.
+    """
+    SAMPLE_PATH = "Data/goodreads_reviews_sample.csv"
+    if not os.path.exists(SAMPLE_PATH) and not os.path.exists(parquet_path_for(SAMPLE_PATH)):
+        st.error("❌ Sample reviews file not found. Please upload 'goodreads_reviews_sample.csv' to the Data folder.")
+        return None, None
 
     try:
-        essential_columns = ['work_id', 'rating', 'review_text', 'n_votes']
-        reviews = pd.read_csv(path, low_memory=False, usecols=essential_columns)
+        essential_columns = list(REVIEWS_DTYPES)
+        reviews = read_data_file(SAMPLE_PATH, REVIEWS_DTYPES, columns=essential_columns)
         required_columns = ['work_id', 'rating', 'review_text']
         missing_columns = [col for col in required_columns if col not in reviews.columns]
         if missing_columns:
             st.error(f"❌ Reviews file is missing columns: {missing_columns}")
-            return None
-        return reviews
+            return None, None
+        return reviews, time.time_ns()
+    except Exception as e:
+        st.error(f"❌ Error loading reviews: {e}")
+        return None, None
+
+@st.cache_resource(ttl=3600)
+def open_reviews_dataset():
+    """Open the full reviews as a Parquet dataset that is read per book instead of loaded into memory."""
+    FULL_PATH = "Data/goodreads_reviews.csv"
+    parquet_path = parquet_path_for(FULL_PATH)
+    try:
+        if not has_current_parquet(FULL_PATH):
+            if not os.path.exists(FULL_PATH):
+                st.error("❌ Full reviews file not found. Please upload 'goodreads_reviews.csv' to the Data folder.")
+                return None
+            # The dataset is only ever read back from the Parquet file, so don't
+            # spend the long parse on a deployment that can't write it
+            if not os.access(os.path.dirname(parquet_path), os.W_OK):
+                st.error(f"❌ Cannot write '{parquet_path}'. Convert the full reviews to Parquet locally and upload it to the Data folder.")
+                return None
+            st.warning("⚠️ The first load converts the full reviews dataset (1.3GB+ file) to Parquet, which needs a lot of memory. Proceed with caution!")
+            # Sorting by work_id keeps each book's reviews in a few row groups
+            convert_to_parquet(FULL_PATH, REVIEWS_DTYPES, usecols=list(REVIEWS_DTYPES), sort_by='work_id', required=True)
+        return ds.dataset(parquet_path, format='parquet')
     except Exception as e:
         st.error(f"❌ Error loading reviews: {e}")
         return None
 
+# Keyed on each distinct set of shown books, and every entry holds all their
+# reviews, so only the most recent pages are kept
+@st.cache_data(ttl=3600, max_entries=16)
+def load_book_reviews(_dataset, work_ids, exclude_spoilers=False):
+    """Read the reviews of some books, letting Arrow push the work_id (and spoiler) filter down to the Parquet scan."""
+    row_filter = ds.field('work_id').isin([int(work_id) for work_id in work_ids])
+    if exclude_spoilers:
+        # Same _SPOILER_RE rule as for the reviews sample, evaluated by Arrow while scanning
+        is_spoiler = pc.match_substring_regex(
+            ds.field('review_text'), pattern=_SPOILER_RE.pattern, ignore_case=True
+        )
+        row_filter &= ds.field('review_text').is_null() | ~is_spoiler
+    table = _dataset.to_table(filter=row_filter, columns=list(REVIEWS_DTYPES))
+    return table.to_pandas()
+
 # Load only works data initially for faster startup
 with st.spinner("📚 Loading book data..."):
-    works_df = load_works_data()
+    works_df, works_version = load_works_data()
 
-# Initialize reviews_df as None - will be loaded when needed
+# Initialize reviews_df/reviews_dataset as None - will be loaded when needed
 if 'reviews_df' not in st.session_state:
     st.session_state.reviews_df = None
+if 'reviews_version' not in st.session_state:
+    st.session_state.reviews_version = None
+if 'reviews_dataset' not in st.session_state:
+    st.session_state.reviews_dataset = None
+if 'filter_cache' not in st.session_state:
+    st.session_state.filter_cache = OrderedDict()
+if 'filter_cache_version' not in st.session_state:
+    st.session_state.filter_cache_version = None
 
 st.sidebar.success("✅ Basic data loaded successfully!")
 
@@ -79,29 +236,74 @@ st.sidebar.success("✅ Basic data loaded successfully!")
 # HELPER FUNCTIONS
 # ===============================================================================
 
+# works_df comes from a cached resource and is never modified, so the helpers
+# derived from it take an underscore argument that Streamlit does not hash
+# on every rerun, plus the cheap works_version token that changes whenever
+# the frame is reloaded
 @st.cache_data(ttl=3600)
-def extract_all_genres(df):
+def extract_all_genres(_df, works_version):
     """Extract all unique genres from the dataset."""
-    genres_set = set()
-    df['genres'] = df['genres'].fillna('')
-    
-    for genres in df['genres']:
-        for g in genres.split(','):
-            g = g.strip()
-            if g:
-                genres_set.add(g)
-    
-    return sorted(list(genres_set))
+    # genres is categorical, so only its distinct strings need splitting
+    genres = _df['genres'].cat.categories.to_series().str.split(',').explode().str.strip()
+    return sorted(genres[genres != ''].unique().tolist())
 
 
-def filter_reviews_no_spoilers(df):
-    """Remove reviews containing spoiler markers."""
-    return df[
-        ~(
-            df['review_text'].str.contains(r'\(view spoiler\)\[', case=False, na=False) |
-            df['review_text'].str.contains('spoiler alert', case=False, na=False)
-        )
-    ]
+@st.cache_data(ttl=3600)
+def list_authors(_df, works_version):
+    """List all authors in alphabetical order."""
+    # author is categorical, so its categories are the unique names (already in order,
+    # which makes the sort a linear pass)
+    return sorted(_df['author'].cat.remove_unused_categories().cat.categories.tolist())
+
+
+@st.cache_resource(ttl=3600)
+def build_genre_index(_df, works_version):
+    """Explode the comma-separated genres into a genre-indexed table of work_ids.
+
+    Built once and shared (read-only) across reruns, so filtering by genre is
+    a lookup on the categorical index rather than a parse of the genre strings.
+    """
+    genre_table = _df[['work_id']].assign(genre=_df['genres'].str.split(',')).explode('genre')
+    genre_table['genre'] = genre_table['genre'].str.strip()
+    genre_table = genre_table[genre_table['genre'].fillna('') != '']
+    return genre_table.astype({'genre': 'category'}).set_index('genre').sort_index()
+
+
+@st.cache_resource(ttl=3600)
+def build_reviews_index(_reviews_df, reviews_version, exclude_spoilers=False):
+    """Map each work_id to the row positions of its reviews, optionally leaving out spoilers."""
+    # The reviews sample is itself a cached resource, so the grouping is built
+    # once and shared instead of being re-hashed and unpickled on every rerun;
+    # reviews_version (from load_reviews_data) ties it to that exact frame.
+    # Spoilers are dropped here, in one pass over all reviews, rather than per book
+    if not exclude_spoilers:
+        return _reviews_df.groupby('work_id').indices
+    kept = np.flatnonzero(
+        ~_reviews_df['review_text'].str.contains(_SPOILER_RE, na=False).to_numpy(dtype=bool)
+    )
+    kept_index = _reviews_df.iloc[kept].groupby('work_id').indices
+    return {work_id: kept[positions] for work_id, positions in kept_index.items()}
+
+
+# Either spoiler marker in one alternation, so the column is scanned once
+_SPOILER_RE = re.compile(r'\(view spoiler\)\[|spoiler alert', re.IGNORECASE)
+
+
+PROFANE_WORDS = [
+    "fuck", "shit", "ass", "bitch", "crap", "damn", "hell", "bastard"
+]
+
+# Compiled once with word boundaries to match whole words only
+_PROFANITY_RE = re.compile(r'\b(' + '|'.join(map(re.escape, PROFANE_WORDS)) + r')\b', re.IGNORECASE)
+
+# Fixed-string byte matcher over the same words; word boundaries are checked by hand
+_PROFANITY_AC = ahocorasick_rs.BytesAhoCorasick(
+    [word.encode('ascii') for word in PROFANE_WORDS],
+    matchkind=ahocorasick_rs.MatchKind.LeftmostLongest
+)
+
+# ASCII bytes that count as word characters for the regex \b
+_WORD_BYTES = frozenset((string.ascii_letters + string.digits + '_').encode('ascii'))
 
 
 def filter_profanity(text):
@@ -109,53 +311,183 @@ def filter_profanity(text):
     if not isinstance(text, str):
         return ""
 
-    profane_words = [
-        "fuck", "shit", "ass", "bitch", "crap", "damn", "hell", "bastard"
+    if not text.isascii():
+        # Byte offsets only line up with characters for ASCII text
+        return _PROFANITY_RE.sub(lambda match: '*' * len(match.group()), text)
+
+    raw = text.encode('ascii')
+    buf = None
+    for _, start, end in _PROFANITY_AC.find_matches_as_indexes(raw.lower()):
+        # Skip matches inside longer words, e.g. "hell" in "shell"
+        if start > 0 and raw[start - 1] in _WORD_BYTES:
+            continue
+        if end < len(raw) and raw[end] in _WORD_BYTES:
+            continue
+        if buf is None:
+            buf = bytearray(raw)
+        # Replace each matched word with asterisks of the same length
+        buf[start:end] = b'*' * (end - start)
+
+    return text if buf is None else buf.decode('ascii')
+
+
+def filter_profanity_series(s):
+    """Replace profane words with asterisks across a whole column of review text."""
+    return s.astype('string').map(filter_profanity, na_action='ignore')
+
+
+def build_reviews_html(reviews):
+    """Render a book's sampled reviews (already profanity-filtered if asked) as one HTML block."""
+    blocks = []
+    for review in reviews.itertuples(index=False):
+        if pd.isna(review.review_text):
+            text = "No review text available."
+        else:
+            text = review.review_text
+
+        # Truncate, and fold line breaks into spaces so the HTML block isn't split
+        review_display = html.escape(' '.join(text[:400].split()), quote=False)
+        if len(text) > 400:
+            review_display += "..."
+
+        # Handle helpful votes display
+        caption = f"⭐ <strong>{review.rating}/5</strong>"
+        n_votes = getattr(review, 'n_votes', None)
+        if not (pd.isna(n_votes) or not n_votes or int(n_votes) == 0):
+            caption += f" | 👍 {int(n_votes)} helpful votes"
+
+        blocks.append(
+            f"<blockquote><em>{review_display}</em></blockquote>\n"
+            f'<p style="font-size: 0.875rem; opacity: 0.6;">{caption}</p>'
+        )
+    return "\n".join(blocks)
+
+
+# A book's card only depends on its works row, so it is keyed by work_id
+# (and the works load) and reused across reruns and filter changes
+@st.cache_data(ttl=3600, show_spinner=False)
+def build_book_card(_row, work_id, works_version):
+    """Render a book row (from itertuples) as one HTML card with its cover and details."""
+    # The browser fetches the covers itself, in parallel; lazy loading
+    # defers the ones below the fold until the user scrolls to them
+    if pd.notna(_row.image_url):
+        cover_url, cover_alt = html.escape(_row.image_url), "Book Cover"
+    else:
+        cover_url, cover_alt = NO_COVER_IMAGE, "No Cover"
+    cover = f'<img src="{cover_url}" width="120" alt="{cover_alt}" loading="lazy" decoding="async">'
 
-    ]
+    # avg_rating is float32, so round away the widening noise (3.9 -> 3.9000000953...)
+    rating_display = round(float(_row.avg_rating), 2)
 
-    # Create pattern with word boundaries to match whole words only
-    pattern = re.compile(r'\b(' + '|'.join(profane_words) + r')\b', re.IGNORECASE)
-    
-    # Replace each matched word with asterisks of the same length
-    return pattern.sub(lambda match: '*' * len(match.group()), text)
+    # Description with better formatting
+    if pd.notna(_row.desc_short):
+        # A blank line would end the HTML block, so line breaks become <br>
+        desc = '<br>'.join(html.escape(_row.desc_short, quote=False).splitlines())
+    else:
+        desc = "<em>No description available</em>"
+
+    # The text is escaped because the card is rendered with unsafe_allow_html
+    return f"""
+<h3>📖 <strong>{html.escape(_row.original_title, quote=False)}</strong></h3>
+<h4><em>by {html.escape(str(_row.author), quote=False)}</em></h4>
+<div style="display: flex; gap: 1.5rem; align-items: flex-start;">
+  <figure style="margin: 0; flex: 0 0 120px; text-align: center;">
+    {cover}
+    <figcaption style="font-size: 0.8rem; opacity: 0.7;">Book Cover</figcaption>
+  </figure>
+  <div>
+    <p><strong>🏷️ Genres:</strong> {html.escape(str(_row.genres), quote=False)}</p>
+    <p><strong>⭐ Rating:</strong> {rating_display}/5.0 ({_row.ratings_display} ratings)</p>
+    <p><strong>📅 Published:</strong> {_row.year_display}</p>
+    <p><strong>📄 Pages:</strong> {_row.pages_display}</p>
+    <p><strong>📝 Description:</strong> {desc}</p>
+  </div>
+</div>
+"""
 
 
-def display_review(review):
-    """Display a single review with proper formatting."""
-    # Filter profanity before displaying
-    if pd.isna(review['review_text']):
-        clean_text = "No review text available."
+DESCRIPTION_PREVIEW_CHARS = 300
+
+
+def shorten_descriptions(descriptions, ellipsis=""):
+    """Cut a column of descriptions to their first DESCRIPTION_PREVIEW_CHARS characters."""
+    shortened = descriptions.str.slice(0, DESCRIPTION_PREVIEW_CHARS)
+    if ellipsis:
+        cut = (descriptions.str.len() > DESCRIPTION_PREVIEW_CHARS).fillna(False)
+        shortened = shortened.mask(cut, shortened + ellipsis)
+    return shortened
+
+
+@st.cache_data(ttl=600, show_spinner=False)
+def build_reading_list_csv(_works_df, works_version, work_index):
+    """Build the reading list CSV for the books at the given works_df index labels."""
+    # The reading list is a column projection of the chosen books
+    books = _works_df.loc[list(work_index)]
+    reading_df = pd.DataFrame({
+        "Title": books['original_title'],
+        "Author": books['author'],
+        "Genres": books['genres'],
+        # avg_rating is float32, so round away the widening noise (3.9 -> 3.9000000953...)
+        "Avg Rating": books['avg_rating'].astype('float64').round(2),
+        "Year": books['original_publication_year'],
+        "Pages": books['num_pages'],
+        "Description": shorten_descriptions(books['description']).fillna('No description available'),
+    })
+    # Encode straight into a bytes buffer, so the download is sent as-is
+    # rather than built as a str and encoded again
+    buffer = io.BytesIO()
+    reading_df.to_csv(buffer, index=False, encoding='utf-8', lineterminator='\n')
+    return buffer.getvalue()
+
+
+def sample_book_reviews(work_ids, exclude_spoilers, filter_prof, per_book=2):
+    """Pick up to per_book random reviews for each of the given books in one pass.
+
+    Returns the number of (spoiler-free, if asked) reviews per work_id and the
+    sampled reviews, so the display loop only has to look its books up.
+    """
+    if st.session_state.reviews_dataset is not None:
+        reviews = load_book_reviews(st.session_state.reviews_dataset, tuple(work_ids), exclude_spoilers)
     else:
-        clean_text = filter_profanity(review['review_text'])
+        reviews_index = build_reviews_index(
+            st.session_state.reviews_df, st.session_state.reviews_version, exclude_spoilers
+        )
+        positions = np.concatenate([reviews_index.get(work_id, []) for work_id in work_ids]).astype(np.intp)
+        reviews = st.session_state.reviews_df.iloc[positions]
 
-    # Display review text with proper truncation
-    review_display = clean_text[:400].replace('\n', ' ')
-    if len(str(clean_text)) > 400:
-        review_display += "..."
-    
-    st.markdown(f"> *{review_display}*")
+    # Shuffling once and keeping the first rows of each book samples every book together
+    sampled = reviews.sample(frac=1).groupby('work_id', sort=False).head(per_book)
+    if filter_prof:
+        sampled = sampled.assign(review_text=filter_profanity_series(sampled['review_text']))
+    return reviews['work_id'].value_counts(), sampled
 
-    # Handle helpful votes display
-    n_votes = review.get('n_votes', None)
-    if pd.isna(n_votes) or not n_votes or int(n_votes) == 0:
-        st.caption(f"⭐ **{review['rating']}/5**")
-    else:
-        st.caption(f"⭐ **{review['rating']}/5** | 👍 {int(n_votes)} helpful votes")
 
+@st.cache_resource(ttl=3600)
+def build_similar_books_index(_works_df, works_version):
+    """Map each work_id to the row positions of its first five similar books that are in the dataset."""
+    # Parse every comma-separated similar_books list once, instead of per displayed book
+    similar_ids = _works_df.set_index('work_id')['similar_books'].str.split(',').explode().str.strip()
+    similar_ids = similar_ids[similar_ids.str.isdigit().fillna(False)].astype('int32')
 
-def display_similar_books(row, works_df):
-    """Display similar books in an expandable section."""
-    similar_ids = str(row.get('similar_books', '')).split(',')
-    similar_ids = [s.strip() for s in similar_ids if s.strip().isdigit()]
-    
-    if similar_ids:
-        similar_books_df = works_df[works_df['work_id'].astype(str).isin(similar_ids)]
-        if not similar_books_df.empty:
-            with st.expander("📖 Show similar books"):
-                for _, sim_row in similar_books_df.head(5).iterrows():
-                    year_text = int(sim_row['original_publication_year']) if pd.notna(sim_row['original_publication_year']) else 'N/A'
-                    st.markdown(f"• **{sim_row['original_title']}** by *{sim_row['author']}* ({year_text})")
+    # Only books with a title in works_df can be shown
+    titled = _works_df['original_title'].notna().to_numpy()
+    row_by_id = pd.Series(np.flatnonzero(titled), index=_works_df['work_id'].to_numpy()[titled])
+
+    pairs = similar_ids.map(row_by_id).dropna().astype('int64').rename('row').reset_index()
+    pairs = pairs.drop_duplicates().groupby('work_id').head(5)
+    return pairs.groupby('work_id')['row'].agg(list).to_dict()
+
+
+def display_similar_books(row, similar_books_index, works_df):
+    """Display similar books for a book row (from itertuples) in an expandable section."""
+    similar_rows = similar_books_index.get(row.work_id)
+    if similar_rows:
+        with st.expander("📖 Show similar books"):
+            similar = works_df.iloc[similar_rows]
+            # The year is a nullable integer column, so it formats without a per-row NA check
+            year_texts = similar['original_publication_year'].astype('string').fillna('N/A')
+            for sim_row, year_text in zip(similar.itertuples(index=False), year_texts):
+                st.markdown(f"• **{sim_row.original_title}** by *{sim_row.author}* ({year_text})")
 
 
 def safe_get_min_max(series, default_min, default_max):
@@ -165,6 +497,18 @@ def safe_get_min_max(series, default_min, default_max):
     except:
         return default_min, default_max
 
+def reviews_loaded():
+    """Check whether the reviews sample or the full reviews dataset is loaded."""
+    return st.session_state.reviews_df is not None or st.session_state.reviews_dataset is not None
+
+
+def count_loaded_reviews():
+    """Count the loaded reviews; the full dataset answers from Parquet metadata."""
+    if st.session_state.reviews_dataset is not None:
+        return st.session_state.reviews_dataset.count_rows()
+    return len(st.session_state.reviews_df)
+
+
 def is_streamlit_cloud():
     """Detect if running on Streamlit Cloud."""
     return os.environ.get("STREAMLIT_SERVER_HEADLESS") == "1"
@@ -187,8 +531,8 @@ with col1:
     st.metric("📖 Total Books", f"{len(works_df):,}")
 with col2:
     # Show reviews count only if loaded
-    if st.session_state.reviews_df is not None:
-        st.metric("📝 Total Reviews", f"{len(st.session_state.reviews_df):,}")
+    if reviews_loaded():
+        st.metric("📝 Total Reviews", f"{count_loaded_reviews():,}")
     else:
         st.metric("📝 Reviews", "Load below ⬇️")
 with col3:
@@ -221,21 +565,26 @@ use_full_reviews = st.sidebar.checkbox(
     disabled=cloud_env
 )
 
-if st.session_state.reviews_df is None:
+if not reviews_loaded():
     st.info("📋 **Reviews not loaded yet.** Click below to load review data for enhanced recommendations!")
     if st.button("📥 **Load Reviews Data**", type="primary"):
         if use_full_reviews and cloud_env:
             st.error("❌ Loading the full dataset is disabled on Streamlit Cloud. Please run locally for this feature.")
         else:
             with st.spinner("📥 Loading reviews data... This may take a moment..."):
-                st.session_state.reviews_df = load_reviews_data(use_full=use_full_reviews)
-                if st.session_state.reviews_df is not None:
+                if use_full_reviews:
+                    st.session_state.reviews_dataset = open_reviews_dataset()
+                else:
+                    st.session_state.reviews_df, st.session_state.reviews_version = load_reviews_data()
+                if reviews_loaded():
                     st.success("✅ Reviews loaded successfully!")
                     st.rerun()
 else:
-    st.success(f"✅ Reviews loaded! ({len(st.session_state.reviews_df):,} reviews available)")
+    st.success(f"✅ Reviews loaded! ({count_loaded_reviews():,} reviews available)")
     if st.button("🗑️ Clear Reviews Data"):
         st.session_state.reviews_df = None
+        st.session_state.reviews_version = None
+        st.session_state.reviews_dataset = None
         st.rerun()
 
 st.markdown("---")
@@ -250,14 +599,15 @@ st.sidebar.markdown("---")
 # Genre and Author Selection
 st.sidebar.markdown("### 📚 **Content Preferences**")
 
-all_genres = extract_all_genres(works_df)
+all_genres = extract_all_genres(works_df, works_version)
+genre_index = build_genre_index(works_df, works_version)
 selected_genres = st.sidebar.multiselect(
     "🏷️ Select preferred genres:",
     all_genres,
     help="Choose one or more genres you enjoy reading"
 )
 
-all_authors = sorted(works_df['author'].dropna().unique())
+all_authors = list_authors(works_df, works_version)
 selected_authors = st.sidebar.multiselect(
     "✍️ Favorite authors (optional):",
     all_authors,
@@ -327,33 +677,21 @@ else:
     min_year_slider = 1000  # fallback if no positive years
 max_year = int(all_years.max())
 
-col1, col2, col3 = st.sidebar.columns(3)
-era_selected = False
-year_range = (min_year_slider, max_year)
-
-if col1.button("🏛️ Ancient\n(pre-500)"):
+# Each preset era maps straight to its year range; anything else uses the slider
+ERA_RANGES = {
     # Use the actual minimum (could be negative) for ancient
-    year_range = (int(all_years.min()), 500)
-    era_selected = True
-elif col2.button("📜 Classical\n(500-1500)"):
-    year_range = (500, 1500)
-    era_selected = True
-elif col3.button("🌟 Modern\n(1500+)"):
-    year_range = (1500, max_year)
-    era_selected = True
-
-col4, col5, col6 = st.sidebar.columns(3)
-if col4.button("🎩 19th Century"):
-    year_range = (1800, 1899)
-    era_selected = True
-elif col5.button("📺 20th Century"):
-    year_range = (1900, 1999)
-    era_selected = True
-elif col6.button("💻 21st Century"):
-    year_range = (2000, max_year)
-    era_selected = True
-
-if not era_selected:
+    "🏛️ Ancient (pre-500)": (int(all_years.min()), 500),
+    "📜 Classical (500-1500)": (500, 1500),
+    "🌟 Modern (1500+)": (1500, max_year),
+    "🎩 19th Century": (1800, 1899),
+    "📺 20th Century": (1900, 1999),
+    "💻 21st Century": (2000, max_year),
+}
+era = st.sidebar.radio("Era:", ["🎚️ Custom range"] + list(ERA_RANGES))
+
+if era in ERA_RANGES:
+    year_range = ERA_RANGES[era]
+else:
     st.sidebar.markdown("**Custom year range:**")
     year_range = st.sidebar.slider(
         "Select range:",
@@ -369,18 +707,15 @@ st.sidebar.markdown("### 📄 **Book Length**")
 
 min_pages, max_pages = safe_get_min_max(works_df['num_pages'], 1, 2000)
 
-col7, col8 = st.sidebar.columns(2)
-page_selected = False
-page_range = (min_pages, max_pages)
-
-if col7.button("📖 Short\n(<250 pages)"):
-    page_range = (min_pages, 250)
-    page_selected = True
-elif col8.button("📚 Long\n(400+ pages)"):
-    page_range = (400, max_pages)
-    page_selected = True
+LENGTH_RANGES = {
+    "📖 Short (<250 pages)": (min_pages, 250),
+    "📚 Long (400+ pages)": (400, max_pages),
+}
+length = st.sidebar.radio("Length:", ["🎚️ Any length"] + list(LENGTH_RANGES), horizontal=True)
 
-if not page_selected:
+if length in LENGTH_RANGES:
+    page_range = LENGTH_RANGES[length]
+else:
     page_range = st.sidebar.slider(
         "Page count range:",
         min_value=min_pages,
@@ -419,74 +754,193 @@ with st.sidebar.expander("🔧 **Advanced Filters**"):
 # FILTER BOOKS BASED ON USER INPUT
 # ===============================================================================
 
-filtered = works_df.copy()
+# Sentinels for the missing years and page counts in the plain numpy copies
+# below, chosen so the range comparisons treat unknowns the way the filters do
+INT16_MIN, INT16_MAX = np.iinfo(np.int16).min, np.iinfo(np.int16).max
+
+
+@st.cache_resource(ttl=3600)
+def build_numeric_filter_columns(_works_df, works_version):
+    """Copy the numeric filter columns once into plain numpy arrays without missing values.
+
+    An unknown year becomes INT16_MIN so it falls outside every partial year
+    range, and an unknown page count is stored twice (INT16_MAX for the lower
+    bound check, INT16_MIN for the upper one) so it passes any page range.
+    """
+    pages = _works_df['num_pages']
+    return {
+        'avg_rating': _works_df['avg_rating'].to_numpy(),
+        'ratings_count': _works_df['ratings_count'].to_numpy(),
+        'text_reviews_count': _works_df['text_reviews_count'].to_numpy(),
+        'year': _works_df['original_publication_year'].to_numpy(dtype=np.int16, na_value=INT16_MIN),
+        'pages_for_min': pages.to_numpy(dtype=np.int16, na_value=INT16_MAX),
+        'pages_for_max': pages.to_numpy(dtype=np.int16, na_value=INT16_MIN),
+    }
+
+
+# Widgets that only change how books are displayed (spoilers, profanity,
+# number of books) rerun the script too, so memoize the filter on its inputs.
+# Leading underscores keep Streamlit from hashing the cached frames each rerun.
+@st.cache_data(ttl=600, show_spinner=False)
+def filter_books(_works_df, works_version, _genre_index, selected_genres, selected_authors, search_title,
+                 min_rating, year_range, full_year_range, page_range, min_ratings,
+                 include_keyword, exclude_keyword, only_with_reviews, _candidate_rows=None):
+    """Return the row positions of the books matching every filter.
+
+    _candidate_rows, when given, must be a superset of the answer (the result
+    of a looser filter); only those rows are scanned.
+    """
+    numeric_columns = build_numeric_filter_columns(_works_df, works_version)
+
+    def column(name):
+        # Take only the columns a filter reads, not the whole frame
+        if _candidate_rows is None:
+            return _works_df[name]
+        return _works_df[name].iloc[_candidate_rows]
+
+    def numeric(name):
+        if _candidate_rows is None:
+            return numeric_columns[name]
+        return numeric_columns[name][_candidate_rows]
+
+    # Collect the cheap column predicates as plain numpy comparisons, AND them
+    # in one reduction and index the frame once, instead of building a new
+    # frame per filter
+    conditions = [
+        numeric('avg_rating') >= min_rating,
+        numeric('ratings_count') >= min_ratings,
+    ]
+
+    if selected_genres:
+        genre_work_ids = _genre_index.loc[list(selected_genres), 'work_id'].unique()
+        conditions.append(column('work_id').isin(genre_work_ids).to_numpy())
+    
+    if selected_authors:
+        # author is categorical, so compare its integer codes rather than the names
+        authors = column('author').cat
+        author_codes = authors.categories.get_indexer(list(selected_authors))
+        conditions.append(np.isin(authors.codes.to_numpy(), author_codes[author_codes >= 0]))
+
+    # Publication year filter. The full range ends at the latest year and also
+    # takes books with unknown or BCE years, so it keeps every book
+    if year_range != full_year_range:
+        years = numeric('year')
+        conditions += [years >= year_range[0], years <= year_range[1]]
+
+    # Page count filter; books with an unknown page count are always kept
+    conditions += [numeric('pages_for_min') >= page_range[0], numeric('pages_for_max') <= page_range[1]]
+
+    if only_with_reviews:
+        conditions.append(numeric('text_reviews_count') > 0)
+
+    rows = np.flatnonzero(np.logical_and.reduce(conditions))
+
+    # The text searches are by far the slowest filters, so they only scan
+    # the rows that survived the numeric ones. They match the text literally;
+    # an escaped pattern goes through Arrow's regex kernel, which is faster
+    # here than its plain substring search
+    if search_title and len(rows):
+        rows = rows[column('_title_search').iloc[rows].str.contains(
+            re.escape(search_title.lower())
+        ).to_numpy(dtype=bool)]
+
+    if include_keyword and len(rows):
+        rows = rows[column('_search_text').iloc[rows].str.contains(
+            re.escape(include_keyword.lower())
+        ).to_numpy(dtype=bool)]
+    
+    if exclude_keyword and len(rows):
+        rows = rows[~column('_search_text').iloc[rows].str.contains(
+            re.escape(exclude_keyword.lower())
+        ).to_numpy(dtype=bool)]
+
+    if _candidate_rows is not None:
+        rows = _candidate_rows[rows]
+    return rows
+
+
+FILTER_CACHE_SIZE = 8
+
+
+def is_refinement(new, old):
+    """Check whether the filters in new can only match a subset of the books old matched."""
+    def narrower_set(new_values, old_values):
+        # Genres and authors are ORed, so fewer selections narrow and none means all
+        return not old_values or (new_values and set(new_values) <= set(old_values))
+
+    def narrower_range(new_range, old_range):
+        return old_range[0] <= new_range[0] and new_range[1] <= old_range[1]
+
+    def contains_old(new_text, old_text):
+        return not old_text or old_text.lower() in new_text.lower()
+
+    return (
+        narrower_set(new['selected_genres'], old['selected_genres'])
+        and narrower_set(new['selected_authors'], old['selected_authors'])
+        and contains_old(new['search_title'], old['search_title'])
+        and contains_old(new['include_keyword'], old['include_keyword'])
+        # Excluding a substring of the old word removes at least the same books
+        and (not old['exclude_keyword']
+             or (new['exclude_keyword'] and new['exclude_keyword'].lower() in old['exclude_keyword'].lower()))
+        and new['min_rating'] >= old['min_rating']
+        and new['min_ratings'] >= old['min_ratings']
+        and narrower_range(new['year_range'], old['year_range'])
+        and narrower_range(new['page_range'], old['page_range'])
+        and new['full_year_range'] == old['full_year_range']
+        and new['only_with_reviews'] >= old['only_with_reviews']
+    )
+
+
+def filter_books_incrementally(works_df, works_version, genre_index, filters):
+    """Filter the books, scanning only the result of an earlier, looser filter when there is one.
+
+    Users mostly tighten filters one widget at a time, so the last few
+    results are kept per session and a refinement of one of them only has
+    to look at the books it matched.
+    """
+    cache = st.session_state.filter_cache
+    # Row positions from an earlier load of works_df don't apply to this one
+    if st.session_state.filter_cache_version != works_version:
+        cache.clear()
+        st.session_state.filter_cache_version = works_version
+    key = tuple(filters.items())
+    candidate_rows = next(
+        (rows for old_key, rows in reversed(cache.items()) if is_refinement(filters, dict(old_key))),
+        None,
+    )
+    rows = filter_books(works_df, works_version, genre_index, _candidate_rows=candidate_rows, **filters)
+
+    cache[key] = rows
+    cache.move_to_end(key)
+    while len(cache) > FILTER_CACHE_SIZE:
+        cache.popitem(last=False)
+    return rows
+
 
 try:
     with st.spinner("🔍 Filtering books based on your preferences..."):
-        # Apply all filters
-        if selected_genres:
-            filtered = filtered[filtered['genres'].fillna('').apply(
-                lambda x: any(g in x for g in selected_genres)
-            )]
-        
-        if selected_authors:
-            filtered = filtered[filtered['author'].isin(selected_authors)]
-        
-        if search_title:
-            filtered = filtered[filtered['original_title'].str.contains(
-                search_title, case=False, na=False
-            )]
-
-        filtered = filtered[filtered['avg_rating'] >= min_rating]
-
-        # Publication year filter
-        # Only include books with unknown years if the user selects the full range
-        if year_range == (min_year_slider, max_year):
-            filtered = filtered[
-                ((filtered['original_publication_year'] >= year_range[0]) &
-                 (filtered['original_publication_year'] <= year_range[1])) |
-                (pd.isna(filtered['original_publication_year'])) |
-                (filtered['original_publication_year'] < min_year_slider)  # include BCE if full range
-            ]
-        else:
-            filtered = filtered[
-                (filtered['original_publication_year'] >= year_range[0]) &
-                (filtered['original_publication_year'] <= year_range[1])
-            ]
-
-        # Page count filter
-        filtered = filtered[
-            ((filtered['num_pages'] >= page_range[0]) &
-             (filtered['num_pages'] <= page_range[1])) |
-            (pd.isna(filtered['num_pages']))
-        ]
-
-        filtered = filtered[filtered['ratings_count'] >= min_ratings]
-
-        if include_keyword:
-            filtered = filtered[
-                filtered['original_title'].str.contains(include_keyword, case=False, na=False) |
-                filtered['description'].str.contains(include_keyword, case=False, na=False)
-            ]
-        
-        if exclude_keyword:
-            filtered = filtered[
-                ~filtered['original_title'].str.contains(exclude_keyword, case=False, na=False) &
-                ~filtered['description'].str.contains(exclude_keyword, case=False, na=False)
-            ]
-        
-        if only_with_reviews:
-            filtered = filtered[filtered['text_reviews_count'] > 0]
-
-        # Sort by rating and popularity
-        filtered = filtered.sort_values(
-            by=['avg_rating', 'ratings_count'],
-            ascending=[False, False]
-        )
+        filtered_rows = filter_books_incrementally(works_df, works_version, genre_index, {
+            'selected_genres': tuple(selected_genres),
+            'selected_authors': tuple(selected_authors),
+            'search_title': search_title,
+            'min_rating': min_rating,
+            'year_range': tuple(year_range),
+            'full_year_range': (min_year_slider, max_year),
+            'page_range': tuple(page_range),
+            'min_ratings': min_ratings,
+            'include_keyword': include_keyword,
+            'exclude_keyword': exclude_keyword,
+            'only_with_reviews': only_with_reviews,
+        })
+        filtered = works_df.iloc[filtered_rows]
+        match_count = len(filtered)
 
-        # Apply surprise mode
+        # Apply surprise mode; its random picks don't need the matches sorted
         if surprise and not filtered.empty:
             filtered = filtered.sample(min(num_books, len(filtered)))
+        else:
+            # Sort by rating and popularity, keeping only the books shown
+            filtered = filtered.nlargest(num_books, ['avg_rating', 'ratings_count'])
 
 except Exception as e:
     st.error(f"❌ Error filtering books: {e}")
@@ -501,104 +955,60 @@ st.markdown(f"## 🎯 **Recommended Books For You**")
 if filtered.empty:
     st.info("🔍 **No books found matching your preferences.** Try adjusting your filters to discover more books!")
 else:
-    st.success(f"📚 **Found {len(filtered)} books matching your criteria!** Showing top {min(num_books, len(filtered))} recommendations.")
+    st.success(f"📚 **Found {match_count} books matching your criteria!** Showing top {min(num_books, match_count)} recommendations.")
     
     st.markdown("---")
     
-    reading_list = []
-    
-    for idx, row in filtered.head(num_books).iterrows():
-        # Book header with better styling
-        st.markdown(f"""
-        ### 📖 **{row['original_title']}**
-        #### *by {row['author']}*
-        """)
-        
-        # Book details in columns
-        cols = st.columns([1, 3])
-        
-        with cols[0]:
-            # Book cover
-            if pd.notna(row['image_url']):
-                st.image(row['image_url'], width=120, caption="Book Cover")
-            else:
-                st.image("https://via.placeholder.com/120x180?text=No+Cover", width=120)
-        
-        with cols[1]:
-            # Book metadata
-            st.markdown(f"**🏷️ Genres:** {row['genres']}")
-            
-            rating_display = row['avg_rating']
-            rating_count = int(row['ratings_count']) if pd.notna(row['ratings_count']) else 0
-            st.markdown(f"**⭐ Rating:** {rating_display}/5.0 ({rating_count:,} ratings)")
-            
-            year_display = int(row['original_publication_year']) if pd.notna(row['original_publication_year']) else 'Unknown'
-            st.markdown(f"**📅 Published:** {year_display}")
-            
-            pages_display = int(row['num_pages']) if pd.notna(row['num_pages']) else 'Unknown'
-            st.markdown(f"**📄 Pages:** {pages_display}")
-            
-            # Description with better formatting
-            if pd.notna(row['description']):
-                desc = row['description'][:300]
-                if len(row['description']) > 300:
-                    desc += "..."
-                st.markdown(f"**📝 Description:** {desc}")
-            else:
-                st.markdown("**📝 Description:** *No description available*")
+    similar_books_index = build_similar_books_index(works_df, works_version)
+
+    # Format the display-only columns for the shown books in one vectorized pass
+    shown = filtered.head(num_books)
+    shown = shown.assign(
+        year_display=shown['original_publication_year'].astype('Int64').astype('string').fillna('Unknown'),
+        pages_display=shown['num_pages'].astype('Int64').astype('string').fillna('Unknown'),
+        ratings_display=shown['ratings_count'].map('{:,}'.format),
+        desc_short=shorten_descriptions(shown['description'], ellipsis="..."),
+    )
 
-        # Reviews section - only if reviews are loaded
-        if st.session_state.reviews_df is not None:
-            st.markdown("#### 💬 **Reader Reviews**")
+    if reviews_loaded():
+        review_counts, sampled_reviews = sample_book_reviews(shown['work_id'], exclude_spoilers, filter_prof)
+        sampled_by_work = sampled_reviews.groupby('work_id').indices
 
-            book_reviews = st.session_state.reviews_df[st.session_state.reviews_df['work_id'] == row['work_id']]
+    for row in shown.itertuples(index=False):
+        # Header, cover and metadata go to the browser as one HTML card
+        st.markdown(build_book_card(row, row.work_id, works_version), unsafe_allow_html=True)
 
-            if exclude_spoilers:
-                book_reviews = filter_reviews_no_spoilers(book_reviews)
+        # Reviews section - only if reviews are loaded
+        if reviews_loaded():
+            st.markdown("#### 💬 **Reader Reviews**")
 
-            if book_reviews.empty:
+            total_reviews = review_counts.get(row.work_id, 0)
+            if total_reviews == 0:
                 st.info("📝 *No reviews available for this book.*")
             else:
-                review_count = min(2, len(book_reviews))
-                st.markdown(f"*Showing {review_count} of {len(book_reviews)} reviews:*")
-
-                for _, review in book_reviews.sample(review_count).iterrows():
-                    if filter_prof:
-                        clean_review = review.copy()
-                        clean_review['review_text'] = filter_profanity(review['review_text'])
-                        display_review(clean_review)
-                    else:
-                        display_review(review)
+                book_reviews = sampled_reviews.iloc[sampled_by_work[row.work_id]]
+                st.markdown(f"*Showing {len(book_reviews)} of {total_reviews} reviews:*")
+
+                st.markdown(build_reviews_html(book_reviews), unsafe_allow_html=True)
         else:
             st.info("📝 *Load reviews data above to see reader reviews for this book.*")
 
         # Similar books
-        display_similar_books(row, works_df)
-
-        # Add to reading list
-        reading_list.append({
-            "Title": row['original_title'],
-            "Author": row['author'],
-            "Genres": row['genres'],
-            "Avg Rating": row['avg_rating'],
-            "Year": row['original_publication_year'],
-            "Pages": row['num_pages'],
-            "Description": row['description'][:300] if pd.notna(row['description']) else 'No description available'
-        })
+        display_similar_books(row, similar_books_index, works_df)
 
         st.markdown("---")
 
     # Download section
-    if reading_list:
+    if not shown.empty:
         st.markdown("### 💾 **Save Your Reading List**")
         
         col1, col2 = st.columns([1, 3])
         
         with col1:
-            reading_df = pd.DataFrame(reading_list)
             st.download_button(
                 label="📥 Download as CSV",
-                data=reading_df.to_csv(index=False),
+                # Only built when the button is clicked, then cached for the same books
+                data=partial(build_reading_list_csv, works_df, works_version, tuple(shown.index)),
                 file_name="my_summer_reading_list.csv",
                 mime="text/csv",
                 help="Download your curated book list to read later or share with friends!"
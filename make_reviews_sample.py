@@ -1,23 +1,80 @@
-import pandas as pd
+import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pa_csv
 import os
 
 # Path to the full reviews file
 FULL_PATH = "Data/goodreads_reviews.csv"
 # Path to the sample output file
 SAMPLE_PATH = "Data/goodreads_reviews_sample.csv"
+# Parquet copy of the sample, which the app reads instead of re-parsing the CSV
+SAMPLE_PARQUET_PATH = os.path.splitext(SAMPLE_PATH)[0] + ".parquet"
+
+# Only the columns the app reads, parsed straight into narrow dtypes
+# (kept in sync with REVIEWS_DTYPES in ReadingListProgram.py)
+SAMPLE_DTYPES = {
+    'work_id': 'int32',
+    'rating': 'float32',  # a few reviews have no rating, so this can't be an integer
+    'review_text': 'string',
+    'n_votes': 'int32',
+}
+# The same types for Arrow's streaming reader, which can't infer them per block
+SAMPLE_ARROW_TYPES = {
+    col: pa.string() if dtype == 'string' else pa.from_numpy_dtype(np.dtype(dtype))
+    for col, dtype in SAMPLE_DTYPES.items()
+}
 
 # Number of rows to sample (adjust as needed for Streamlit Cloud)
 N_SAMPLE = 5000
 
+# Bytes of CSV parsed per batch; only one batch plus the sample is ever held in memory
+BLOCK_SIZE = 16 << 20
+
+
+def reservoir_sample(path, n, seed=42, block_size=BLOCK_SIZE):
+    """Uniformly sample n rows from a CSV without loading the whole file."""
+    # Arrow's multi-threaded reader streams the file as record batches; the
+    # review texts span several lines, so quoted newlines must be allowed
+    reader = pa_csv.open_csv(
+        path,
+        read_options=pa_csv.ReadOptions(block_size=block_size),
+        parse_options=pa_csv.ParseOptions(newlines_in_values=True),
+        convert_options=pa_csv.ConvertOptions(
+            include_columns=list(SAMPLE_ARROW_TYPES),
+            column_types=SAMPLE_ARROW_TYPES,
+            strings_can_be_null=True,
+        ),
+    )
+
+    # Give every row a random key and keep the n smallest keys seen so far,
+    # which is a uniform sample without replacement built batch by batch
+    rng = np.random.default_rng(seed)
+    sample = None
+    sample_keys = np.empty(0)
+    total_rows = 0
+    for batch in reader:
+        total_rows += batch.num_rows
+        batch_table = pa.Table.from_batches([batch])
+        sample = batch_table if sample is None else pa.concat_tables([sample, batch_table])
+        sample_keys = np.concatenate([sample_keys, rng.random(batch.num_rows)])
+        if len(sample_keys) > n:
+            keep = np.argpartition(sample_keys, n)[:n]
+            sample, sample_keys = sample.take(keep), sample_keys[keep]
+    if sample is None:
+        # Headers-only file: no batch was read, so return an empty sample
+        sample = reader.schema.empty_table()
+    return sample.to_pandas().astype(SAMPLE_DTYPES), total_rows
+
+
 if not os.path.exists(FULL_PATH):
     print(f"Full reviews file not found at {FULL_PATH}. Please make sure it exists.")
+elif os.path.getsize(FULL_PATH) == 0:
+    print(f"Full reviews file at {FULL_PATH} is empty. Please download it again.")
 else:
-    print(f"Loading full reviews file from {FULL_PATH}...")
-    df = pd.read_csv(FULL_PATH, low_memory=False)
-    print(f"Full reviews file has {len(df):,} rows.")
+    print(f"Sampling {N_SAMPLE} random rows from {FULL_PATH}...")
+    sample_df, total_rows = reservoir_sample(FULL_PATH, N_SAMPLE)
+    print(f"Full reviews file has {total_rows:,} rows.")
 
-    print(f"Sampling {N_SAMPLE} random rows...")
-    sample_df = df.sample(N_SAMPLE, random_state=42)
     sample_df.to_csv(SAMPLE_PATH, index=False)
-    print(f"Sample saved to {SAMPLE_PATH} ({len(sample_df):,} rows).")
-
+    sample_df.to_parquet(SAMPLE_PARQUET_PATH, engine='pyarrow', compression='snappy', index=False)
+    print(f"Sample saved to {SAMPLE_PATH} and {SAMPLE_PARQUET_PATH} ({len(sample_df):,} rows).")